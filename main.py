@@ -1,16 +1,29 @@
+from contextlib import asynccontextmanager
 from pathlib import Path
+from typing import AsyncIterator
 
 from fastmcp import FastMCP
 from fastmcp.server.providers import FileSystemProvider
 from starlette.requests import Request
 from starlette.responses import PlainTextResponse
 
+from mcp_server import tools
+
 provider = FileSystemProvider(
     root=Path(__file__).parent / "mcp_server",
     reload=True,
 )
 
-mcp = FastMCP("ocr-mcp-server", providers=[provider])
+
+@asynccontextmanager
+async def lifespan(_mcp: FastMCP) -> AsyncIterator[None]:
+    """Release shared resources (pooled HTTP clients) on shutdown."""
+    yield
+    await tools._ocr_batcher.aclose()
+    await tools._ocr_client.aclose()
+
+
+mcp = FastMCP("ocr-mcp-server", providers=[provider], lifespan=lifespan)
 
 
 @mcp.custom_route("/", methods=["GET"])
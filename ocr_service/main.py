@@ -1,12 +1,17 @@
+import asyncio
 from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
 from typing import Awaitable, Callable
 from uuid import uuid4
 
+import httpx
 from fastapi import FastAPI, Request, Response
+from fastapi.responses import ORJSONResponse
 
 from logger import RequestContextVar, get_logger, request_ctx_var
+from ocr import OcrBatchQueue
 from routes import router
+from settings import settings
 
 logger = get_logger()
 
@@ -31,7 +36,36 @@ async def lifespan(app: FastAPI):
         app.state.pipeline = pipeline
 
         # Use max_workers=1 to serialize GPU operations and prevent OOM
-        app.state.executor = ThreadPoolExecutor(max_workers=1)
+        app.state.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ocr")
+
+        # One properly sized pool for all non-GPU blocking work; installing
+        # it as the loop default means every asyncio.to_thread call (temp
+        # files, disk writes, markdown reads) shares this budget instead of
+        # Python's separately sized stock pool.
+        app.state.io_executor = ThreadPoolExecutor(
+            max_workers=settings.THREAD_POOL_SIZE, thread_name_prefix="io"
+        )
+        asyncio.get_running_loop().set_default_executor(app.state.io_executor)
+
+        # Micro-batches predict calls across concurrent requests; its single
+        # consumer task also serializes GPU access, so no extra semaphore.
+        app.state.ocr_batcher = OcrBatchQueue(
+            pipeline,
+            app.state.executor,
+            max_batch_size=settings.OCR_BATCH_SIZE,
+            max_wait=settings.OCR_BATCH_WAIT_MS / 1000,
+        )
+        app.state.ocr_batcher.start()
+
+        # One pooled client for all document downloads: per-request clients
+        # pay TCP+TLS setup every time, and HTTP/2 multiplexes multi-URL
+        # batches over a single connection per host.
+        app.state.http = httpx.AsyncClient(
+            http2=True,
+            timeout=settings.DOWNLOAD_TIMEOUT,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+            follow_redirects=True,
+        )
 
         logger.info("PaddleOCR-VL pipeline initialized successfully")
 
@@ -43,10 +77,20 @@ async def lifespan(app: FastAPI):
 
     yield
 
+    if hasattr(app.state, "ocr_batcher"):
+        await app.state.ocr_batcher.aclose()
+
+    if hasattr(app.state, "http"):
+        await app.state.http.aclose()
+
     if hasattr(app.state, "executor"):
         app.state.executor.shutdown(wait=True)
         logger.info("Thread pool executor shut down")
 
+    if hasattr(app.state, "io_executor"):
+        app.state.io_executor.shutdown(wait=True)
+        logger.info("I/O thread pool shut down")
+
     if hasattr(app.state, "pipeline"):
         del app.state.pipeline
 
@@ -58,6 +102,7 @@ app = FastAPI(
     description="Microservice for PaddleOCR-VL with async processing",
     version="0.1.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 
@@ -4,11 +4,14 @@ import os
 import shutil
 import tempfile
 from concurrent.futures import ThreadPoolExecutor
-from contextlib import contextmanager
-from typing import Any, Generator
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import Any, AsyncGenerator
 from urllib.parse import urlparse
 
+import aiofiles
 import httpx
+from fastapi import UploadFile
 
 from logger import get_logger
 from schemas import DownloadError, OCRResult, OCRStatus
@@ -26,145 +29,454 @@ ALLOWED_MIME_TYPES = {
 }
 
 
-@contextmanager
-def temp_file_cleanup(suffix: str) -> Generator[str, None, None]:
-    """Context manager for temporary file cleanup"""
+@lru_cache(maxsize=64)
+def guess_ext(content_type: str) -> str | None:
+    """Cached mimetypes.guess_extension; only a handful of types ever recur."""
+    return mimetypes.guess_extension(content_type)
+
+
+def _remove_temp_file(tmp_path: str) -> None:
+    """Best-effort removal of a temporary file."""
+    if os.path.exists(tmp_path):
+        try:
+            os.remove(tmp_path)
+        except OSError as e:
+            logger.warning(
+                "Failed to cleanup temp file",
+                extra={"path": tmp_path, "error": str(e)},
+            )
+
+
+def _make_temp_file(suffix: str) -> str:
+    """Blocking temp-file allocation, meant to run in a worker thread."""
     tmp_file = tempfile.NamedTemporaryFile(suffix=suffix, delete=False)
     tmp_path = tmp_file.name
     tmp_file.close()
+    return tmp_path
+
+
+def _remove_temp_dir(tmp_dir: str) -> None:
+    """Best-effort removal of a temporary directory."""
+    if os.path.exists(tmp_dir):
+        try:
+            shutil.rmtree(tmp_dir)
+        except OSError as e:
+            logger.warning(
+                "Failed to cleanup temp directory",
+                extra={"path": tmp_dir, "error": str(e)},
+            )
+
+
+@asynccontextmanager
+async def temp_file_cleanup(suffix: str) -> AsyncGenerator[str, None]:
+    """Async context manager for temporary file cleanup.
+
+    Allocation and removal hit the filesystem, so both run in worker
+    threads to keep the event loop free.
+    """
+    tmp_path = await asyncio.to_thread(_make_temp_file, suffix)
 
     try:
         yield tmp_path
     finally:
-        if os.path.exists(tmp_path):
-            try:
-                os.remove(tmp_path)
-            except OSError as e:
-                logger.warning(
-                    "Failed to cleanup temp file",
-                    extra={"path": tmp_path, "error": str(e)},
-                )
+        await asyncio.to_thread(_remove_temp_file, tmp_path)
 
 
-@contextmanager
-def temp_dir_cleanup() -> Generator[str, None, None]:
-    """Context manager for temporary directory cleanup"""
-    tmp_dir = tempfile.mkdtemp()
+@asynccontextmanager
+async def temp_dir_cleanup() -> AsyncGenerator[str, None]:
+    """Async context manager for temporary directory cleanup"""
+    tmp_dir = await asyncio.to_thread(tempfile.mkdtemp)
 
     try:
         yield tmp_dir
     finally:
-        if os.path.exists(tmp_dir):
-            try:
-                shutil.rmtree(tmp_dir)
-            except OSError as e:
-                logger.warning(
-                    "Failed to cleanup temp directory",
-                    extra={"path": tmp_dir, "error": str(e)},
-                )
+        await asyncio.to_thread(_remove_temp_dir, tmp_dir)
+
+
+# Transient statuses worth retrying; anything else fails immediately.
+_RETRYABLE_STATUS = {429, 502, 503, 504}
+
+# Backoff schedule; the length doubles as the attempt count.
+_RETRY_BACKOFF = (0.5, 1.0, 2.0)
+
 
+async def _probe(client: httpx.AsyncClient, url: str) -> None:
+    """Reject oversized or unsupported files from a HEAD before the GET.
 
-async def download_file(client: httpx.AsyncClient, url: str) -> tuple[bytes, str]:
-    """Download file from URL and return content with extension."""
+    Turns bad inputs into sub-RTT failures instead of transferring a
+    whole body just to discard it. Best-effort: servers that refuse HEAD
+    or omit headers fall through to the streaming GET, which enforces the
+    same limits.
+    """
     try:
-        response = await client.get(
-            url, follow_redirects=True, timeout=settings.DOWNLOAD_TIMEOUT
-        )
-        response.raise_for_status()
+        response = await client.head(url)
+    except httpx.RequestError:
+        return
 
-        content_length = response.headers.get("content-length")
-        if content_length and int(content_length) > settings.MAX_DOWNLOAD_SIZE:
-            raise DownloadError(
-                f"File too large: {int(content_length) / 1024 / 1024:.1f}MB"
-            )
+    if response.status_code >= 400:
+        return
 
-        content_type = response.headers.get("content-type", "").split(";")[0].strip()
-        if content_type and content_type not in ALLOWED_MIME_TYPES:
-            raise DownloadError(f"Unsupported content type: {content_type}")
+    content_length = response.headers.get("content-length")
+    if content_length and int(content_length) > settings.MAX_DOWNLOAD_SIZE:
+        raise DownloadError(
+            f"File too large: {int(content_length) / 1024 / 1024:.1f}MB"
+        )
 
-        parsed_url = urlparse(url)
-        _, ext = os.path.splitext(parsed_url.path)
+    content_type = response.headers.get("content-type", "").split(";")[0].strip()
+    if content_type and content_type not in ALLOWED_MIME_TYPES:
+        raise DownloadError(f"Unsupported content type: {content_type}")
 
-        if not ext and content_type:
-            guessed_ext = mimetypes.guess_extension(content_type)
-            if guessed_ext:
-                ext = guessed_ext
 
-        if not ext:
-            ext = ".png"
+async def _download_once(client: httpx.AsyncClient, url: str) -> tuple[str, int]:
+    """Single streaming download attempt; returns (tmp_path, size)."""
+    tmp_path: str | None = None
+    try:
+        async with client.stream("GET", url) as response:
+            response.raise_for_status()
 
-        return response.content, ext
+            content_length = response.headers.get("content-length")
+            if content_length and int(content_length) > settings.MAX_DOWNLOAD_SIZE:
+                raise DownloadError(
+                    f"File too large: {int(content_length) / 1024 / 1024:.1f}MB"
+                )
 
-    except httpx.TimeoutException as e:
-        raise DownloadError(f"Download timeout: {e}")
-    except httpx.HTTPStatusError as e:
-        raise DownloadError(f"HTTP {e.response.status_code}")
-    except httpx.RequestError as e:
-        raise DownloadError(f"Request failed: {e}")
+            content_type = (
+                response.headers.get("content-type", "").split(";")[0].strip()
+            )
+            if content_type and content_type not in ALLOWED_MIME_TYPES:
+                raise DownloadError(f"Unsupported content type: {content_type}")
+
+            parsed_url = urlparse(url)
+            _, ext = os.path.splitext(parsed_url.path)
+
+            if not ext and content_type:
+                guessed_ext = guess_ext(content_type)
+                if guessed_ext:
+                    ext = guessed_ext
+
+            if not ext:
+                ext = ".png"
+
+            tmp_path = await asyncio.to_thread(_make_temp_file, ext)
+
+            # Abort as soon as the running total exceeds the cap instead of
+            # transferring the whole body (content-length can be absent or
+            # lie).
+            total = 0
+            async with aiofiles.open(tmp_path, "wb") as f:
+                async for chunk in response.aiter_bytes(chunk_size=64 * 1024):
+                    total += len(chunk)
+                    if total > settings.MAX_DOWNLOAD_SIZE:
+                        raise DownloadError(
+                            f"File too large: exceeds "
+                            f"{settings.MAX_DOWNLOAD_SIZE / 1024 / 1024:.0f}MB limit"
+                        )
+                    await f.write(chunk)
+
+        return tmp_path, total
+
+    except BaseException:
+        if tmp_path is not None:
+            await asyncio.to_thread(_remove_temp_file, tmp_path)
+        raise
+
+
+def _retry_after_delay(exc: httpx.HTTPStatusError) -> float | None:
+    """Parse a Retry-After header in seconds, if present and numeric."""
+    value = exc.response.headers.get("retry-after")
+    if value:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return None
+
+
+@asynccontextmanager
+async def download_to_tempfile(
+    client: httpx.AsyncClient, url: str
+) -> AsyncGenerator[tuple[str, int], None]:
+    """Stream a URL straight to a temp file and yield (path, size).
+
+    Chunks are written to disk via aiofiles as they arrive, so the full
+    payload never exists in memory and the event loop is never blocked on
+    disk I/O. The temp file is created here rather than by the caller
+    because its suffix depends on the response headers; it is removed on
+    exit. Transient failures (timeouts, protocol blips, 429/5xx
+    throttling) are retried with exponential backoff, honoring
+    Retry-After when the server sends one.
+    """
+    tmp_path: str | None = None
+    attempts = len(_RETRY_BACKOFF)
+    try:
+        await _probe(client, url)
 
+        for attempt, backoff in enumerate(_RETRY_BACKOFF):
+            try:
+                tmp_path, total = await _download_once(client, url)
+                break
+            except httpx.HTTPStatusError as e:
+                status_code = e.response.status_code
+                if status_code not in _RETRYABLE_STATUS or attempt == attempts - 1:
+                    raise DownloadError(f"HTTP {status_code}")
+                delay = _retry_after_delay(e) or backoff
+            except httpx.TimeoutException as e:
+                if attempt == attempts - 1:
+                    raise DownloadError(f"Download timeout: {e}")
+                delay = backoff
+            except httpx.RemoteProtocolError as e:
+                if attempt == attempts - 1:
+                    raise DownloadError(f"Request failed: {e}")
+                delay = backoff
+            except httpx.RequestError as e:
+                raise DownloadError(f"Request failed: {e}")
+
+            logger.warning(
+                "Retrying download",
+                extra={"url": url, "attempt": attempt + 1, "delay_s": delay},
+            )
+            await asyncio.sleep(delay)
 
-async def run_ocr(executor: ThreadPoolExecutor, pipeline: Any, file_path: str) -> Any:
-    """Run OCR prediction in thread pool to avoid blocking"""
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(executor, pipeline.predict, file_path)
+        # The retry loop either breaks with a finished download or raises.
+        assert tmp_path is not None
+        yield tmp_path, total
 
+    finally:
+        if tmp_path is not None:
+            await asyncio.to_thread(_remove_temp_file, tmp_path)
+
+
+class OcrBatchQueue:
+    """Micro-batches pipeline.predict calls across concurrent requests.
+
+    PaddleOCR-VL batches VLM inference internally when handed several
+    inputs at once, so one executor submission with a list of paths
+    amortizes GPU launch overhead that per-path calls pay repeatedly.
+    Jobs wait up to ``max_wait`` seconds for companions before the batch
+    is flushed; the single consumer task also serializes access to the
+    GPU, replacing the previous per-call semaphore.
+    """
+
+    def __init__(
+        self,
+        pipeline: Any,
+        executor: ThreadPoolExecutor,
+        max_batch_size: int,
+        max_wait: float,
+    ) -> None:
+        self.pipeline = pipeline
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue: asyncio.Queue[tuple[str, asyncio.Future]] = asyncio.Queue()
+        self._worker: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def aclose(self) -> None:
+        if self._worker is not None and not self._worker.done():
+            self._worker.cancel()
+
+    async def predict(self, file_path: str) -> Any:
+        """Enqueue a path and wait for its OCR output."""
+        fut: asyncio.Future = asyncio.get_running_loop().create_future()
+        await self._queue.put((file_path, fut))
+        return await fut
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
 
-def extract_markdown(output: Any, temp_out_dir: str) -> str:
-    """Extract markdown content from OCR output"""
-    md_content = ""
+            await self._flush(batch)
 
+    async def _flush(self, batch: list[tuple[str, asyncio.Future]]) -> None:
+        loop = asyncio.get_running_loop()
+
+        if len(batch) > 1:
+            paths = [path for path, _ in batch]
+            logger.info("Flushing OCR batch", extra={"batch_size": len(paths)})
+            try:
+                outputs = await loop.run_in_executor(
+                    self.executor, self.pipeline.predict, paths
+                )
+                grouped = self._group_by_path(outputs, paths)
+            except Exception:
+                logger.exception("Batched OCR prediction failed")
+                grouped = None
+
+            if grouped is not None:
+                for path, fut in batch:
+                    if not fut.done():
+                        fut.set_result(grouped[path])
+                return
+            # Attribution or batch inference failed; isolate per path below.
+
+        for path, fut in batch:
+            try:
+                output = await loop.run_in_executor(
+                    self.executor, self.pipeline.predict, path
+                )
+                if not fut.done():
+                    fut.set_result(output)
+            except Exception as exc:
+                if not fut.done():
+                    fut.set_exception(exc)
+
+    @staticmethod
+    def _group_by_path(outputs: Any, paths: list[str]) -> dict[str, list] | None:
+        """Attribute flattened batch results back to their input paths.
+
+        Multi-page inputs yield one result per page, so results are
+        grouped by their input_path. Returns None if any result cannot be
+        attributed, in which case the caller re-runs paths individually.
+        """
+        grouped: dict[str, list] = {path: [] for path in paths}
+
+        for res in outputs or []:
+            in_path = getattr(res, "input_path", None)
+            if in_path is None:
+                try:
+                    in_path = res["input_path"]
+                except Exception:
+                    return None
+            in_path = str(in_path)
+            if in_path not in grouped:
+                return None
+            grouped[in_path].append(res)
+
+        return grouped
+
+
+def _markdown_from_result(res: Any) -> str | None:
+    """Pull markdown out of a single in-memory result object, if exposed."""
+    md = getattr(res, "markdown", None)
+    if isinstance(md, str):
+        return md
+    if isinstance(md, dict):
+        text = md.get("markdown_texts") or md.get("text")
+        if isinstance(text, str):
+            return text
+
+    to_md = getattr(res, "to_markdown", None)
+    if callable(to_md):
+        try:
+            text = to_md()
+        except Exception as e:
+            logger.warning("to_markdown failed", extra={"error": str(e)})
+            return None
+        if isinstance(text, str):
+            return text
+
+    return None
+
+
+def extract_markdown_inline(output: Any) -> str | None:
+    """Build markdown from in-memory result objects when possible.
+
+    Skips the save-to-disk/read-back round trip (2N file operations plus
+    a temp dir lifecycle per request) whenever the pipeline results carry
+    their markdown directly. Returns None if any page lacks it, so the
+    caller can fall back to the on-disk path.
+    """
+    if not output:
+        return None
+
+    parts = []
+    for res in output:
+        md = _markdown_from_result(res)
+        if md is None:
+            return None
+        parts.append(md)
+
+    return "\n\n".join(parts).strip()
+
+
+def _list_markdown_files(temp_out_dir: str) -> list[str]:
+    """List .md paths in page order; scandir avoids a stat per entry."""
+    if not os.path.exists(temp_out_dir):
+        return []
+
+    return sorted(
+        entry.path for entry in os.scandir(temp_out_dir) if entry.name.endswith(".md")
+    )
+
+
+def _read_markdown_file(path: str) -> str:
+    """Blocking read of one markdown page, meant for a worker thread."""
+    with open(path, "rb") as f:
+        return f.read().decode("utf-8")
+
+
+async def extract_markdown(output: Any, temp_out_dir: str) -> str:
+    """Extract markdown content from OCR output.
+
+    Page files are read concurrently via worker threads so a 50-page PDF
+    overlaps its disk latencies instead of paying them serially on the
+    event loop.
+    """
     if output:
         for res in output:
             if hasattr(res, "save_to_markdown"):
-                res.save_to_markdown(save_path=temp_out_dir)
+                await asyncio.to_thread(res.save_to_markdown, save_path=temp_out_dir)
             else:
                 logger.warning("Result object missing save_to_markdown method")
 
-    if os.path.exists(temp_out_dir):
-        for filename in sorted(os.listdir(temp_out_dir)):
-            if filename.endswith(".md"):
-                file_path = os.path.join(temp_out_dir, filename)
-                try:
-                    with open(file_path, "r", encoding="utf-8") as f:
-                        md_content += f.read() + "\n\n"
-                except Exception as e:
-                    logger.error(
-                        "Failed to read markdown file",
-                        extra={"file": filename, "error": str(e)},
-                    )
+    paths = await asyncio.to_thread(_list_markdown_files, temp_out_dir)
+
+    contents = await asyncio.gather(
+        *(asyncio.to_thread(_read_markdown_file, path) for path in paths),
+        return_exceptions=True,
+    )
+
+    parts = []
+    for path, content in zip(paths, contents):
+        if isinstance(content, BaseException):
+            logger.error(
+                "Failed to read markdown file",
+                extra={"file": os.path.basename(path), "error": str(content)},
+            )
+        else:
+            parts.append(content)
 
-    return md_content.strip()
+    return "\n\n".join(parts).strip()
 
 
 async def process_single_url(
-    client: httpx.AsyncClient, url: str, pipeline: Any, executor: ThreadPoolExecutor
+    client: httpx.AsyncClient, url: str, batcher: OcrBatchQueue
 ) -> OCRResult:
     """Process a single URL and return OCR result"""
     try:
-        content, ext = await download_file(client, url)
+        async with download_to_tempfile(client, url) as (tmp_file_path, size):
+            logger.info("Processing file", extra={"url": url, "size_kb": size / 1024})
 
-        with temp_file_cleanup(ext) as tmp_file_path:
-            with open(tmp_file_path, "wb") as f:
-                f.write(content)
+            output = await batcher.predict(tmp_file_path)
 
-            logger.info(
-                "Processing file", extra={"url": url, "size_kb": len(content) / 1024}
-            )
-
-            output = await run_ocr(executor, pipeline, tmp_file_path)
-
-            with temp_dir_cleanup() as temp_out_dir:
-                md_content = extract_markdown(output, temp_out_dir)
+            md_content = extract_markdown_inline(output)
+            if md_content is None:
+                async with temp_dir_cleanup() as temp_out_dir:
+                    md_content = await extract_markdown(output, temp_out_dir)
 
             if not md_content:
-                return OCRResult(
+                return OCRResult.model_construct(
                     url=url,
                     status=OCRStatus.ERROR,
                     error="No text extracted",
                     error_type="empty_result",
                 )
 
-            return OCRResult(
+            return OCRResult.model_construct(
                 url=url,
                 status=OCRStatus.SUCCESS,
                 text=md_content,
@@ -173,13 +485,13 @@ async def process_single_url(
 
     except DownloadError as e:
         logger.warning("Download failed", extra={"url": url, "error": str(e)})
-        return OCRResult(
+        return OCRResult.model_construct(
             url=url, status=OCRStatus.ERROR, error=str(e), error_type="download_error"
         )
 
     except Exception as e:
         logger.error("Processing failed", extra={"url": url, "error": str(e)})
-        return OCRResult(
+        return OCRResult.model_construct(
             url=url,
             status=OCRStatus.ERROR,
             error=f"{type(e).__name__}: {str(e)}",
@@ -188,23 +500,40 @@ async def process_single_url(
 
 
 async def process_uploaded_file(
-    content: bytes, ext: str, filename: str, pipeline: Any, executor: ThreadPoolExecutor
+    file: UploadFile, ext: str, filename: str, batcher: OcrBatchQueue
 ) -> tuple[str | None, str | None, int]:
-    """Process uploaded file content and return (text, error, pages)"""
+    """Process an uploaded file and return (text, error, pages).
+
+    The upload is streamed to a temp file in 64KB chunks rather than read
+    into memory first, with the same running-total size guard as URL
+    downloads (the declared size can be absent or lie).
+    """
     try:
-        with temp_file_cleanup(ext) as tmp_file_path:
-            with open(tmp_file_path, "wb") as f:
-                f.write(content)
+        async with temp_file_cleanup(ext) as tmp_file_path:
+            total = 0
+            async with aiofiles.open(tmp_file_path, "wb") as f:
+                while chunk := await file.read(64 * 1024):
+                    total += len(chunk)
+                    if total > settings.MAX_DOWNLOAD_SIZE:
+                        return (
+                            None,
+                            f"File too large: exceeds "
+                            f"{settings.MAX_DOWNLOAD_SIZE / 1024 / 1024:.0f}MB limit",
+                            0,
+                        )
+                    await f.write(chunk)
 
             logger.info(
                 "Processing uploaded file",
-                extra={"file_name": filename, "size_kb": len(content) / 1024},
+                extra={"file_name": filename, "size_kb": total / 1024},
             )
 
-            output = await run_ocr(executor, pipeline, tmp_file_path)
+            output = await batcher.predict(tmp_file_path)
 
-            with temp_dir_cleanup() as temp_out_dir:
-                md_content = extract_markdown(output, temp_out_dir)
+            md_content = extract_markdown_inline(output)
+            if md_content is None:
+                async with temp_dir_cleanup() as temp_out_dir:
+                    md_content = await extract_markdown(output, temp_out_dir)
 
             if not md_content:
                 return None, "No text extracted from document", 0
@@ -1,18 +1,26 @@
 import asyncio
-import mimetypes
 import os
+import time
 
-import httpx
 from fastapi import APIRouter, HTTPException, Request, UploadFile
 
 from logger import get_logger
-from ocr import ALLOWED_MIME_TYPES, process_single_url, process_uploaded_file
-from schemas import OCRRequest, OCRResponse, OCRStatus, UploadOCRResponse
+from ocr import ALLOWED_MIME_TYPES, guess_ext, process_single_url, process_uploaded_file
+from schemas import OCRRequest, OCRResponse, OCRResult, OCRStatus, UploadOCRResponse
 from settings import settings
 
 logger = get_logger()
 router = APIRouter()
 
+# Resolve the device lookup once at import instead of re-importing paddle
+# inside the readiness handler on every probe.
+try:
+    import paddle
+
+    _get_device = paddle.device.get_device
+except ImportError:
+    _get_device = lambda: "unknown"  # noqa: E731
+
 
 @router.get("/")
 def health_check():
@@ -27,9 +35,7 @@ def readiness_check(request: Request):
         _pipeline = request.app.state.pipeline
         executor = request.app.state.executor
 
-        import paddle
-
-        device = paddle.device.get_device()
+        device = _get_device()
 
         return {
             "status": "ready",
@@ -52,21 +58,47 @@ async def ocr(request: Request, body: OCRRequest) -> OCRResponse:
     - Supported formats: PNG, JPEG, TIFF, PDF
     """
     try:
-        pipeline = request.app.state.pipeline
-        executor = request.app.state.executor
+        client = request.app.state.http
+        batcher = request.app.state.ocr_batcher
     except AttributeError:
         raise HTTPException(status_code=503, detail="OCR pipeline is not initialized")
 
-    async with httpx.AsyncClient() as client:
-        tasks = [
-            process_single_url(client, url, pipeline, executor) for url in body.urls
-        ]
-        results = await asyncio.gather(*tasks)
-
-    successful = sum(1 for r in results if r.status == OCRStatus.SUCCESS)
+    # Shared deadline across all URLs so one slow or retrying download
+    # cannot hold the whole response past the configured budget.
+    deadline = time.monotonic() + settings.REQUEST_DEADLINE
+
+    async def _with_deadline(url: str) -> OCRResult:
+        try:
+            return await asyncio.wait_for(
+                process_single_url(client, url, batcher),
+                timeout=max(0.0, deadline - time.monotonic()),
+            )
+        except asyncio.TimeoutError:
+            logger.warning("Request deadline exceeded", extra={"url": url})
+            return OCRResult.model_construct(
+                url=url,
+                status=OCRStatus.ERROR,
+                error="Request deadline exceeded",
+                error_type="timeout",
+            )
+
+    # Duplicate URLs in one request share a single download/OCR task; the
+    # result is fanned back out so the response still mirrors the input
+    # order and multiplicity.
+    unique: dict[str, asyncio.Task] = {}
+    for url in body.urls:
+        if url not in unique:
+            unique[url] = asyncio.create_task(_with_deadline(url))
+
+    await asyncio.gather(*unique.values())
+    results = [unique[url].result() for url in body.urls]
+
+    successful = 0
+    for r in results:
+        successful += r.status is OCRStatus.SUCCESS
     failed = len(results) - successful
 
-    return OCRResponse(
+    return OCRResponse.model_construct(
         results=results,
         total_processed=len(results),
         successful=successful,
@@ -83,8 +115,7 @@ async def ocr_upload(request: Request, file: UploadFile) -> UploadOCRResponse:
     - **file**: Upload an image (PNG, JPEG, TIFF) or PDF (max 10MB)
     """
     try:
-        pipeline = request.app.state.pipeline
-        executor = request.app.state.executor
+        batcher = request.app.state.ocr_batcher
     except AttributeError:
         raise HTTPException(status_code=503, detail="OCR pipeline is not initialized")
 
@@ -92,32 +123,33 @@ async def ocr_upload(request: Request, file: UploadFile) -> UploadOCRResponse:
     content_type = file.content_type or ""
 
     if content_type and content_type not in ALLOWED_MIME_TYPES:
-        return UploadOCRResponse(
+        return UploadOCRResponse.model_construct(
             status=OCRStatus.ERROR,
             error=f"Unsupported content type: {content_type}",
             filename=filename,
         )
 
-    content = await file.read()
-
-    if len(content) > settings.MAX_DOWNLOAD_SIZE:
-        return UploadOCRResponse(
+    # Reject on the declared size up front; process_uploaded_file enforces
+    # the same cap again while streaming, since clients can omit or
+    # understate it.
+    if file.size is not None and file.size > settings.MAX_DOWNLOAD_SIZE:
+        return UploadOCRResponse.model_construct(
             status=OCRStatus.ERROR,
-            error=f"File too large: {len(content) / 1024 / 1024:.1f}MB (max: 10MB)",
+            error=f"File too large: {file.size / 1024 / 1024:.1f}MB (max: 10MB)",
             filename=filename,
         )
 
     _, ext = os.path.splitext(filename)
     if not ext:
-        ext = mimetypes.guess_extension(content_type) or ".png"
+        ext = guess_ext(content_type) or ".png"
 
-    text, error, pages = await process_uploaded_file(
-        content, ext, filename, pipeline, executor
-    )
+    text, error, pages = await process_uploaded_file(file, ext, filename, batcher)
 
     if error:
-        return UploadOCRResponse(status=OCRStatus.ERROR, error=error, filename=filename)
+        return UploadOCRResponse.model_construct(
+            status=OCRStatus.ERROR, error=error, filename=filename
+        )
 
-    return UploadOCRResponse(
+    return UploadOCRResponse.model_construct(
         status=OCRStatus.SUCCESS, text=text, pages=pages, filename=filename
     )
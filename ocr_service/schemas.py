@@ -1,9 +1,13 @@
+import re
 from enum import Enum
 
 from pydantic import BaseModel, Field, field_validator
 
 from settings import settings
 
+# Compiled once at import; the validator runs per URL on every request.
+_HTTP_RE = re.compile(r"^https?://")
+
 
 # Custom Exceptions
 class OCRError(Exception):
@@ -49,7 +53,7 @@ class OCRRequest(BaseModel):
     @classmethod
     def validate_urls(cls, v: list[str]) -> list[str]:
         for url in v:
-            if not url.startswith(("http://", "https://")):
+            if not _HTTP_RE.match(url):
                 raise ValueError(f"URL must start with http:// or https://: {url}")
         return v
 
@@ -58,6 +62,9 @@ class OCRRequest(BaseModel):
     }
 
 
+# Response models are built server-side from trusted values (and hot paths
+# use model_construct to skip validation), so they are frozen; full
+# validation stays on request ingress via OCRRequest.
 class OCRResult(BaseModel):
     url: str
     status: OCRStatus
@@ -66,6 +73,8 @@ class OCRResult(BaseModel):
     error_type: str | None = None
     pages: int | None = None
 
+    model_config = {"frozen": True}
+
 
 class OCRResponse(BaseModel):
     results: list[OCRResult]
@@ -73,6 +82,8 @@ class OCRResponse(BaseModel):
     successful: int
     failed: int
 
+    model_config = {"frozen": True}
+
 
 class UploadOCRResponse(BaseModel):
     status: OCRStatus
@@ -80,3 +91,5 @@ class UploadOCRResponse(BaseModel):
     error: str | None = None
     pages: int | None = None
     filename: str
+
+    model_config = {"frozen": True}
@@ -1,6 +1,19 @@
+import os
+
 from pydantic import field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+# Pin per-process math threads before paddle is imported anywhere. On CPU,
+# each pipeline.predict otherwise spawns its own OpenMP/MKL thread team,
+# which multiplies against the server's thread pools and oversubscribes the
+# scheduler; parallelism is handled at the asyncio/executor layer instead.
+# setdefault keeps deployments free to override via the environment.
+os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+os.environ.setdefault("OMP_NUM_THREADS", "1")
+os.environ.setdefault("MKL_NUM_THREADS", "1")
+os.environ.setdefault("OPENBLAS_NUM_THREADS", "1")
+os.environ.setdefault("CPU_NUM", "1")
+
 
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(
@@ -13,6 +26,23 @@ class Settings(BaseSettings):
 
     MAX_URLS_PER_REQUEST: int = 10
 
+    # Download limits
+    MAX_DOWNLOAD_SIZE: int = 10 * 1024 * 1024  # 10MB
+    DOWNLOAD_TIMEOUT: float = 30.0
+
+    # Micro-batching for pipeline.predict: jobs wait up to OCR_BATCH_WAIT_MS
+    # for companions, then up to OCR_BATCH_SIZE paths go to the GPU in one
+    # executor submission.
+    OCR_BATCH_SIZE: int = 8
+    OCR_BATCH_WAIT_MS: int = 20
+
+    # Workers in the shared I/O thread pool (downloads to disk, temp file
+    # lifecycle, markdown reads); GPU work keeps its own single worker.
+    THREAD_POOL_SIZE: int = 8
+
+    # Total wall-clock budget for one /ocr request across all its URLs.
+    REQUEST_DEADLINE: float = 300.0
+
     @field_validator("DEBUG", mode="before")
     @classmethod
     def validate_debug(cls, v: str) -> int:
@@ -23,6 +23,10 @@ class Settings(BaseSettings):
     # Configuration constants
     MAX_URLS_PER_REQUEST: int = 10
 
+    # Max in-flight requests to the OCR service; the service serializes GPU
+    # work internally, so unbounded fan-out just piles up there.
+    MCP_MAX_CONCURRENCY: int = 4
+
     @field_validator("DEBUG", mode="before")
     @classmethod
     def validate_debug(cls, v: str) -> int: